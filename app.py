@@ -3,16 +3,23 @@
 app.py - Jevicarn site with one-time admin registration then login using hithere.db
 Admin dashboard now includes gallery management controls and GitHub repo file management.
 Pulse receiver endpoint added to accept pings from breathe/pulse senders.
+
+Boot: create_app() builds the Flask app, runs the one-time storage init and precompiles
+templates. Run it with `gunicorn --preload 'app:create_app()'` (as the Procfile does) so that
+work happens once in the master; workers fork afterwards and open their own DB connections
+per request. Heavy modules (requests) are imported lazily where they are used. Scheduled
+maintenance/snapshot jobs are started after fork, in a single worker (gunicorn.conf.py).
 """
 from flask import (
     Flask, render_template, request, redirect, url_for, flash,
-    send_from_directory, session, jsonify, send_file
+    send_from_directory, session, jsonify, send_file, current_app,
+    Response, stream_with_context
 )
 import os
 import sqlite3
+import click
 from threading import Thread
 import time
-import requests
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -20,18 +27,26 @@ import uuid
 import csv
 import io
 import json
+import base64
+import maintenance
+import backup
+import freeze
+from datetime import datetime
 
 # --- CONFIG ---
-app = Flask(__name__, template_folder="templates")
-app.secret_key = os.getenv("FLASK_SECRET", "change-this-secret")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_FOLDER = os.path.join(BASE_DIR, 'static')
 # uploads directory inside static
-UPLOAD_FOLDER = os.path.join(app.static_folder, 'uploads')
-CONTACTS_DB = 'contacts.db'   # site DB (messages + gallery)
-ADMIN_DB = 'hithere.db'       # admins DB
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+UPLOAD_FOLDER = os.path.join(STATIC_FOLDER, 'uploads')
+CONTACTS_DB = os.getenv('CONTACTS_DB', 'contacts.db')   # site DB (messages + gallery)
+ADMIN_DB = os.getenv('ADMIN_DB', 'hithere.db')          # admins DB
 
 ALLOWED_IMG_EXTS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.tiff'}
 
+# gallery pagination (first page is rendered server-side, the rest via /api/gallery)
+GALLERY_PAGE_SIZE = int(os.getenv('GALLERY_PAGE_SIZE', 24))
+GALLERY_MAX_PAGE_SIZE = 100
+
 # GitHub config (env)
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 GITHUB_REPO = os.getenv('GITHUB_REPO')  # "owner/repo"
@@ -40,6 +55,25 @@ GITHUB_BRANCH = os.getenv('GITHUB_BRANCH', 'main')
 # Pulse / forwarding token (accept either name)
 PULSE_TOKEN = os.getenv('PULSE_TOKEN') or os.getenv('FORWARD_TOKEN')
 
+# Retention / maintenance (see maintenance.py)
+# RETENTION_DAYS: per-platform age limits in days, e.g. "pulse=30,*=365" (`*` = every other platform)
+RETENTION_DAYS = maintenance.parse_retention(os.getenv('RETENTION_DAYS', 'pulse=30'))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+MAINTENANCE_LOCK = os.getenv('MAINTENANCE_LOCK', CONTACTS_DB + '.maintenance.lock')
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv('MAINTENANCE_INTERVAL_HOURS', '24'))  # 0 = no in-process scheduler (use cron)
+SCHEDULER_LOCK = os.getenv('SCHEDULER_LOCK', CONTACTS_DB + '.scheduler.lock')       # held by the worker running jobs
+
+# Online DB snapshots (see backup.py)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', 7))                    # per database
+SNAPSHOT_PAGES = int(os.getenv('SNAPSHOT_PAGES', 64))                 # pages copied per backup step
+SNAPSHOT_SLEEP_MS = float(os.getenv('SNAPSHOT_SLEEP_MS', 5))          # pause between steps
+SNAPSHOT_INTERVAL_HOURS = float(os.getenv('SNAPSHOT_INTERVAL_HOURS', '0'))  # 0 = not scheduled
+
+# Static freeze of the public pages (see freeze.py)
+FROZEN_DIR = os.getenv('FROZEN_DIR', 'frozen')
+SERVE_FROZEN = os.getenv('SERVE_FROZEN', '0') == '1'   # freeze at boot and serve the build ahead of Flask
+
 # --- DB helpers & initialization ---
 def get_conn(db_file):
     return sqlite3.connect(db_file)
@@ -47,6 +81,8 @@ def get_conn(db_file):
 def init_contacts_db():
     conn = get_conn(CONTACTS_DB)
     c = conn.cursor()
+    # WAL lets pulse/contact writers and page readers overlap; maintenance checkpoints it
+    c.execute('PRAGMA journal_mode=WAL')
     c.execute('''CREATE TABLE IF NOT EXISTS messages (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         sender TEXT,
@@ -58,6 +94,14 @@ def init_contacts_db():
         platform TEXT,
         timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
     )''')
+    # older databases predate these columns
+    c.execute('PRAGMA table_info(messages)')
+    cols = [col[1] for col in c.fetchall()]
+    for missing in ['receiver', 'location', 'platform']:
+        if missing not in cols:
+            c.execute(f'ALTER TABLE messages ADD COLUMN {missing} TEXT;')
+    # retention scans expired rows per platform
+    c.execute('CREATE INDEX IF NOT EXISTS idx_messages_platform_ts ON messages (platform, timestamp)')
     c.execute('CREATE TABLE IF NOT EXISTS contacts (id INTEGER PRIMARY KEY, name TEXT, email TEXT, message TEXT)')
     c.execute('''CREATE TABLE IF NOT EXISTS gallery (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -65,6 +109,8 @@ def init_contacts_db():
         caption TEXT,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP
     )''')
+    # keyset pagination walks gallery by (created_at, id); id is the rowid so this index covers both
+    c.execute('CREATE INDEX IF NOT EXISTS idx_gallery_created_at ON gallery (created_at)')
     conn.commit()
     conn.close()
 
@@ -113,33 +159,141 @@ def verify_admin_credentials(username, password):
     _, db_user, db_hash = row
     return check_password_hash(db_hash, password)
 
-# init DBs
-init_contacts_db()
-init_admin_db()
+def init_storage():
+    """
+    One-time, idempotent setup: upload folder, schema and the env-provided admin.
+    Called from create_app(); every connection opened here is closed again, so nothing
+    leaks into gunicorn workers forked after a --preload boot.
+    """
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    init_contacts_db()
+    init_admin_db()
 
-# auto create admin from env if none exists
-if admin_count() == 0:
-    env_user = os.getenv('ADMIN_USER')
-    env_pass = os.getenv('ADMIN_PASS')
-    if env_user and env_pass:
-        create_admin(env_user, env_pass)
-        print(f"[INIT] Admin created from env: {env_user}")
+    # auto create admin from env if none exists
+    if admin_count() == 0:
+        env_user = os.getenv('ADMIN_USER')
+        env_pass = os.getenv('ADMIN_PASS')
+        if env_user and env_pass:
+            create_admin(env_user, env_pass)
+            print(f"[INIT] Admin created from env: {env_user}")
+
+# --- routes are collected here and bound to the app in create_app() ---
+ROUTES = []
+
+def route(rule, **options):
+    def decorator(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return decorator
 
 # --- helpers: admin protection ---
 def require_admin():
     return bool(session.get('admin_logged_in'))
 
+# --- helpers: frozen public pages ---
+def gallery_changed():
+    """
+    Call after any gallery mutation: schedules a (debounced) re-freeze of the public pages
+    when a frozen build is being served or has been made with `flask freeze`.
+    """
+    if SERVE_FROZEN or os.path.exists(os.path.join(FROZEN_DIR, freeze.MANIFEST_NAME)):
+        freeze.request_freeze(current_app._get_current_object(), FROZEN_DIR)
+
+# --- helpers: gallery pagination ---
+def encode_cursor(parts):
+    raw = json.dumps(parts, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Returns the decoded cursor list, or None if the cursor is malformed.
+    A 'db' cursor must be ['db', created_at (str or null), id (int)], so nothing else
+    ever reaches the keyset query as a bind parameter.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        parts = json.loads(raw.decode('utf-8'))
+    except Exception:
+        return None
+    if not isinstance(parts, list) or not parts or parts[0] not in ('db', 'static'):
+        return None
+    if parts[0] == 'db' and (len(parts) != 3
+                             or not (parts[1] is None or isinstance(parts[1], str))
+                             or not isinstance(parts[2], int) or isinstance(parts[2], bool)
+                             or not -2**63 <= parts[2] < 2**63):
+        return None
+    return parts
+
+def static_gallery_files():
+    gallery_dir = os.path.join(STATIC_FOLDER, 'gallery')
+    if not os.path.exists(gallery_dir):
+        return []
+    return sorted(img for img in os.listdir(gallery_dir) if Path(img).suffix.lower() in ALLOWED_IMG_EXTS)
+
+def gallery_item(path, item_id=None, caption=None, created_at=None):
+    return {
+        'id': item_id,
+        'path': path,
+        'alt': caption or Path(path).stem,
+        'caption': caption or '',
+        'created_at': created_at,
+    }
+
+def gallery_page(cursor=None, limit=GALLERY_PAGE_SIZE):
+    """
+    One page of the public gallery, newest first.
+    - DB rows are walked with a keyset cursor on (created_at, id) so deep pages stay cheap.
+    - If the gallery table is empty, the bundled static/gallery images are paged by offset instead.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed cursor.
+    """
+    parts = decode_cursor(cursor) if cursor else None
+    if cursor and parts is None:
+        raise ValueError('bad_cursor')
+
+    if parts is None or parts[0] == 'db':
+        conn = get_conn(CONTACTS_DB)
+        c = conn.cursor()
+        if parts is None:
+            c.execute('SELECT id, filename, caption, created_at FROM gallery '
+                      'ORDER BY created_at DESC, id DESC LIMIT ?', (limit + 1,))
+        else:
+            c.execute('SELECT id, filename, caption, created_at FROM gallery '
+                      'WHERE (created_at, id) < (?, ?) '
+                      'ORDER BY created_at DESC, id DESC LIMIT ?', (parts[1], parts[2], limit + 1))
+        rows = c.fetchall()
+        conn.close()
+        if rows or parts is not None:
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(['db', rows[-1][3], rows[-1][0]])
+            items = [gallery_item(f'uploads/{r[1]}', r[0], r[2], r[3]) for r in rows]
+            return items, next_cursor
+        parts = ['static', 0]
+
+    # fallback: bundled static gallery, paged by offset
+    try:
+        offset = max(int(parts[1]), 0)
+    except (IndexError, TypeError, ValueError):
+        raise ValueError('bad_cursor')
+    files = static_gallery_files()
+    window = files[offset:offset + limit]
+    next_cursor = encode_cursor(['static', offset + limit]) if offset + limit < len(files) else None
+    return [gallery_item(f'gallery/{f}') for f in window], next_cursor
+
 # --- Public site routes ---
-@app.route('/')
+@route('/')
 def splash():
     return render_template('tomorrowanimation.html')
 
-@app.route('/home')
-@app.route('/index.html')
+@route('/home')
+@route('/index.html')
 def home():
     conn = get_conn(CONTACTS_DB)
     c = conn.cursor()
-    c.execute('SELECT filename FROM gallery ORDER BY created_at DESC')
+    # the home page only previews 8 images
+    c.execute('SELECT filename FROM gallery ORDER BY created_at DESC LIMIT 8')
     rows = c.fetchall()
     conn.close()
     if rows:
@@ -148,7 +302,7 @@ def home():
         images = []
         if os.path.exists(UPLOAD_FOLDER):
             images = [f'uploads/{img}' for img in os.listdir(UPLOAD_FOLDER)
-                      if Path(img).suffix.lower() in ALLOWED_IMG_EXTS]
+                      if Path(img).suffix.lower() in ALLOWED_IMG_EXTS][:8]
     seo_keywords = (
         "Jevicarn Christian School, Day and Night Daycare, Kindergarten in Ruiru, "
         "Preschool in Kiambu, Childcare, Early Learning Centre, Babycare, "
@@ -163,26 +317,42 @@ def home():
         location='Ebenezer, Ruiru – Kiambu County'
     )
 
-@app.route('/gallery')
+@route('/gallery')
 def gallery():
-    conn = get_conn(CONTACTS_DB)
-    c = conn.cursor()
-    c.execute('SELECT filename FROM gallery ORDER BY created_at DESC')
-    rows = c.fetchall()
-    conn.close()
-    if rows:
-        images = [f'uploads/{r[0]}' for r in rows]
-    else:
-        images = [f'gallery/{img}' for img in os.listdir(os.path.join(app.static_folder, 'gallery'))
-                  if Path(img).suffix.lower() in ALLOWED_IMG_EXTS] \
-                 if os.path.exists(os.path.join(app.static_folder, 'gallery')) else []
-    return render_template('gallery.html', images=images)
+    # only the first page is rendered here; main.js pulls the rest from /api/gallery
+    items, next_cursor = gallery_page()
+    return render_template('gallery.html', items=items, next_cursor=next_cursor)
 
-@app.route("/programs")
+@route('/api/gallery', methods=['GET'])
+def api_gallery():
+    """
+    Cursor-paginated gallery feed. Query params: cursor (from a previous next_cursor), limit.
+    Returns JSON with items (newest first), next_cursor and next (URL of the following
+    page); both are null on the last page. Clients should follow `next`, which a frozen
+    build rewrites to static JSON files.
+    """
+    try:
+        limit = int(request.args.get('limit', GALLERY_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'bad_limit'}), 400
+    limit = min(max(limit, 1), GALLERY_MAX_PAGE_SIZE)
+    try:
+        items, next_cursor = gallery_page(request.args.get('cursor') or None, limit)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'bad_cursor'}), 400
+    for it in items:
+        it['src'] = url_for('static', filename=it['path'])
+    next_url = None
+    if next_cursor:
+        extra = {'limit': limit} if limit != GALLERY_PAGE_SIZE else {}
+        next_url = url_for('api_gallery', cursor=next_cursor, **extra)
+    return jsonify({'success': True, 'items': items, 'next_cursor': next_cursor, 'next': next_url})
+
+@route("/programs")
 def programs():
     return render_template("programs.html", title="Programs", description="Programs offered at Jevicarn Christian Kindergarten & School", keywords="daycare, kindergarten, primary school, nightcare, Jevicarn, Juja")
 
-@app.route('/contact', methods=['GET', 'POST'])
+@route('/contact', methods=['GET', 'POST'])
 def contact():
     conn = get_conn(CONTACTS_DB)
     c = conn.cursor()
@@ -205,20 +375,17 @@ def contact():
     return render_template('contact.html', messages_list=messages_list)
 
 # serve uploaded images from static/uploads
-@app.route('/uploads/<path:filename>')
+@route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    uploads_dir = os.path.join(app.static_folder, 'uploads')
+    uploads_dir = os.path.join(current_app.static_folder, 'uploads')
     return send_from_directory(uploads_dir, filename)
 
-@app.route('/keepalive-ping')
+@route('/keepalive-ping')
 def keepalive_ping():
     return "pong", 200
-@app.route("/pulse_receiver", methods=["POST", "GET"])
-def pulse_receiver():
-    return "ok", 200
 
 # --- Pulse receiver endpoint (for breathe/pinger) ---
-@app.route('/pulse_receiver', methods=['POST', 'GET'])
+@route('/pulse_receiver', methods=['POST', 'GET'])
 def pulse_receiver():
     """
     Accept inbound pulses from breathe or other pingers.
@@ -291,7 +458,7 @@ def pulse_receiver():
     return jsonify({'success': True, 'id': new_id, 'sender': sender_name}), 200
 
 # --- ADMIN / AUTH ROUTES ---
-@app.route('/admin', methods=['GET'])
+@route('/admin', methods=['GET'])
 def admin():
     num = admin_count()
     logged_in = session.get('admin_logged_in', False)
@@ -305,14 +472,6 @@ def admin():
     # prepare dashboard + gallery items
     conn = get_conn(CONTACTS_DB)
     c = conn.cursor()
-    c.execute('PRAGMA table_info(messages)')
-    cols = [col[1] for col in c.fetchall()]
-    for missing in ['receiver', 'location', 'platform']:
-        if missing not in cols:
-            try:
-                c.execute(f'ALTER TABLE messages ADD COLUMN {missing} TEXT;')
-            except Exception:
-                pass
 
     c.execute('SELECT COUNT(*) FROM messages')
     total_msgs = c.fetchone()[0] or 0
@@ -367,11 +526,11 @@ def admin():
         gallery_items=gallery_items
     )
 
-@app.route('/!0pl', methods=['GET'])
+@route('/!0pl', methods=['GET'])
 def admin_alias():
     return admin()
 
-@app.route('/admin/register', methods=['POST'])
+@route('/admin/register', methods=['POST'])
 def admin_register():
     if admin_count() > 0:
         flash("Registration not allowed. An admin already exists.", "error")
@@ -400,7 +559,7 @@ def admin_register():
     flash("Admin account created and logged in", "success")
     return redirect(url_for('admin'))
 
-@app.route('/admin/login', methods=['POST'])
+@route('/admin/login', methods=['POST'])
 def admin_login():
     if admin_count() == 0:
         flash("No admin exists. Please register first.", "error")
@@ -421,7 +580,7 @@ def admin_login():
         flash("Invalid credentials", "error")
         return redirect(url_for('admin'))
 
-@app.route('/admin/logout', methods=['POST'])
+@route('/admin/logout', methods=['POST'])
 def admin_logout():
     session.pop('admin_logged_in', None)
     session.pop('admin_user', None)
@@ -429,38 +588,109 @@ def admin_logout():
     return redirect(url_for('admin'))
 
 # --- ADMIN: gallery upload/delete (called from admin.html) ---
-@app.route('/admin/gallery/upload', methods=['POST'])
+@route('/admin/gallery/upload', methods=['POST'])
 def admin_gallery_upload():
     if not require_admin():
         flash("Please log in to upload images", "error")
         return redirect(url_for('admin'))
 
-    file = request.files.get('file')
+    # the form's input is `multiple`; without JS every selected file arrives here
+    files = [f for f in request.files.getlist('file') if f and f.filename]
     caption = request.form.get('caption', '').strip()
-    if not file or file.filename == '':
+    if not files:
         flash("No file selected", "error")
         return redirect(url_for('admin'))
 
-    filename_orig = secure_filename(file.filename)
-    ext = Path(filename_orig).suffix.lower()
-    if ext not in ALLOWED_IMG_EXTS:
+    saved, rejected = [], 0
+    for file in files:
+        ext = Path(secure_filename(file.filename)).suffix.lower()
+        if ext not in ALLOWED_IMG_EXTS:
+            rejected += 1
+            continue
+        unique = f"{uuid.uuid4().hex}{ext}"
+        file.save(os.path.join(UPLOAD_FOLDER, unique))
+        saved.append(unique)
+
+    if not saved:
         flash("Unsupported image type", "error")
         return redirect(url_for('admin'))
 
-    unique = f"{uuid.uuid4().hex}{ext}"
-    save_path = os.path.join(UPLOAD_FOLDER, unique)
-    file.save(save_path)
-
     conn = get_conn(CONTACTS_DB)
     c = conn.cursor()
-    c.execute('INSERT INTO gallery (filename, caption) VALUES (?, ?)', (unique, caption))
+    c.executemany('INSERT INTO gallery (filename, caption) VALUES (?, ?)', [(u, caption) for u in saved])
     conn.commit()
     conn.close()
 
-    flash("Image uploaded", "success")
+    gallery_changed()
+    if len(saved) == 1 and not rejected:
+        flash("Image uploaded", "success")
+    else:
+        flash(f"{len(saved)} images uploaded" + (f", {rejected} skipped (unsupported type)" if rejected else ""), "success")
     return redirect(url_for('admin'))
 
-@app.route('/admin/gallery/replace_ajax', methods=['POST'])
+@route('/admin/gallery/upload_batch', methods=['POST'])
+def admin_gallery_upload_batch():
+    """
+    AJAX batch upload. Multipart form with any number of `files` parts and an optional `caption`.
+    - Each file is streamed to UPLOAD_FOLDER under a unique name.
+    - All gallery rows are inserted in one transaction; if that fails the saved files are removed.
+    Returns JSON with one result per file, in request order.
+    """
+    if not require_admin():
+        return jsonify({'success': False, 'error': 'not_logged_in'}), 401
+
+    files = request.files.getlist('files')
+    caption = request.form.get('caption', '').strip()
+    if not files:
+        return jsonify({'success': False, 'error': 'missing_files'}), 400
+
+    results = []
+    saved = []   # (result index, unique name)
+    for file in files:
+        filename_orig = secure_filename(file.filename or '')
+        ext = Path(filename_orig).suffix.lower()
+        if not filename_orig:
+            results.append({'name': file.filename, 'success': False, 'error': 'missing_name'})
+            continue
+        if ext not in ALLOWED_IMG_EXTS:
+            results.append({'name': file.filename, 'success': False, 'error': 'bad_type'})
+            continue
+        unique = f"{uuid.uuid4().hex}{ext}"
+        try:
+            file.save(os.path.join(UPLOAD_FOLDER, unique))
+        except Exception as e:
+            print("upload_batch: save failed:", e)
+            results.append({'name': file.filename, 'success': False, 'error': 'save_failed'})
+            continue
+        saved.append((len(results), unique))
+        results.append({'name': file.filename, 'success': True, 'filename': unique, 'caption': caption})
+
+    if saved:
+        conn = get_conn(CONTACTS_DB)
+        try:
+            with conn:
+                c = conn.cursor()
+                for idx, unique in saved:
+                    c.execute('INSERT INTO gallery (filename, caption) VALUES (?, ?)', (unique, caption))
+                    results[idx]['id'] = c.lastrowid
+                    results[idx]['url'] = url_for('uploaded_file', filename=unique)
+        except Exception as e:
+            print("upload_batch: DB insert error:", e)
+            for idx, unique in saved:
+                try:
+                    os.remove(os.path.join(UPLOAD_FOLDER, unique))
+                except OSError:
+                    pass
+                results[idx] = {'name': results[idx]['name'], 'success': False, 'error': 'db_error'}
+        finally:
+            conn.close()
+
+    uploaded = sum(1 for r in results if r['success'])
+    if uploaded:
+        gallery_changed()
+    return jsonify({'success': uploaded > 0, 'uploaded': uploaded, 'results': results})
+
+@route('/admin/gallery/replace_ajax', methods=['POST'])
 def admin_gallery_replace_ajax():
     if not require_admin():
         return jsonify({'success': False, 'error': 'not_logged_in'}), 401
@@ -503,9 +733,10 @@ def admin_gallery_replace_ajax():
     conn.commit()
     conn.close()
 
+    gallery_changed()
     return jsonify({'success': True, 'id': item_id, 'filename': new_name})
 
-@app.route('/admin/gallery/delete', methods=['POST'])
+@route('/admin/gallery/delete', methods=['POST'])
 def admin_gallery_delete():
     """
     Traditional form POST (non-AJAX) delete. Keeps original behavior but with safer path checks.
@@ -542,10 +773,11 @@ def admin_gallery_delete():
     conn.commit()
     conn.close()
 
+    gallery_changed()
     flash("Image deleted", "success")
     return redirect(url_for('admin'))
 
-@app.route('/admin/gallery/delete_ajax', methods=['POST'])
+@route('/admin/gallery/delete_ajax', methods=['POST'])
 def admin_gallery_delete_ajax():
     """
     AJAX delete endpoint returning JSON. Body should be JSON: {"id": <id>}
@@ -578,10 +810,11 @@ def admin_gallery_delete_ajax():
     c.execute('DELETE FROM gallery WHERE id = ?', (item_id,))
     conn.commit()
     conn.close()
+    gallery_changed()
     return jsonify({'success': True, 'id': item_id})
 
 # --- ADMIN: sync existing static uploads into gallery DB ---
-@app.route('/admin/gallery/sync', methods=['POST'])
+@route('/admin/gallery/sync', methods=['POST'])
 def admin_gallery_sync():
     """
     Admin-only: scan the uploads folder and insert any files missing from the gallery table.
@@ -607,8 +840,67 @@ def admin_gallery_sync():
             imported.append(fname)
     conn.commit()
     conn.close()
+    if imported:
+        gallery_changed()
     return jsonify({'success': True, 'imported': len(imported), 'files': imported})
 
+# --- ADMIN: gallery ZIP export / import ---
+def gallery_folders():
+    return [('uploads', UPLOAD_FOLDER), ('gallery', os.path.join(STATIC_FOLDER, 'gallery'))]
+
+def parse_day(value):
+    """
+    Validate an optional 'YYYY-MM-DD' query value. Returns the string or None; raises ValueError.
+    """
+    if not value:
+        return None
+    datetime.strptime(value, '%Y-%m-%d')
+    return value
+
+@route('/admin/gallery/export', methods=['GET'])
+def admin_gallery_export():
+    """
+    Stream a ZIP of static/uploads + static/gallery with a manifest.json of gallery rows.
+    Optional ?since=YYYY-MM-DD&until=YYYY-MM-DD (inclusive) limits rows and files by date.
+    """
+    if not require_admin():
+        flash("Please log in to export the gallery", "error")
+        return redirect(url_for('admin'))
+    try:
+        since = parse_day(request.args.get('since'))
+        until = parse_day(request.args.get('until'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'bad_date'}), 400
+
+    chunks = backup.export_gallery(CONTACTS_DB, gallery_folders(), since, until)
+    download_name = f"gallery-export-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.zip"
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'},
+    )
+
+@route('/admin/gallery/import', methods=['POST'])
+def admin_gallery_import():
+    """
+    Import an archive produced by /admin/gallery/export (multipart field `archive`).
+    Returns JSON with counts of files written/skipped and gallery rows inserted/skipped.
+    """
+    if not require_admin():
+        return jsonify({'success': False, 'error': 'not_logged_in'}), 401
+    file = request.files.get('archive')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'error': 'missing_archive'}), 400
+    try:
+        summary = backup.import_gallery(file.stream, CONTACTS_DB, dict(gallery_folders()), ALLOWED_IMG_EXTS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print("gallery import failed:", e)
+        return jsonify({'success': False, 'error': 'import_failed', 'detail': str(e)}), 500
+    gallery_changed()
+    return jsonify({'success': True, **summary})
+
 # --- GitHub integration endpoints (list / delete / delete_batch / import) ---
 def gh_headers():
     headers = {'Accept': 'application/vnd.github+json'}
@@ -622,7 +914,7 @@ def gh_repo_parts():
     owner, repo = GITHUB_REPO.split('/', 1)
     return owner, repo
 
-@app.route('/admin/github/list', methods=['GET'])
+@route('/admin/github/list', methods=['GET'])
 def admin_github_list():
     if not require_admin():
         return jsonify({'error': 'not_logged_in'}), 401
@@ -631,6 +923,8 @@ def admin_github_list():
     if not owner:
         return jsonify({'error': 'GITHUB_REPO not configured'}), 500
 
+    import requests
+
     # Use git/trees recursive to list files
     tree_url = f'https://api.github.com/repos/{owner}/{repo}/git/trees/{GITHUB_BRANCH}?recursive=1'
     try:
@@ -656,7 +950,7 @@ def admin_github_list():
     except Exception as e:
         return jsonify({'error': 'exception', 'detail': str(e)}), 500
 
-@app.route('/admin/github/delete', methods=['POST'])
+@route('/admin/github/delete', methods=['POST'])
 def admin_github_delete():
     """
     Delete a single file in the repo. JSON body: { "path": "<path/in/repo>" }
@@ -675,6 +969,8 @@ def admin_github_delete():
     if not GITHUB_TOKEN:
         return jsonify({'success': False, 'error': 'no_token_configured'}), 500
 
+    import requests
+
     # fetch sha for file
     contents_url = f'https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={GITHUB_BRANCH}'
     r = requests.get(contents_url, headers=gh_headers(), timeout=15)
@@ -690,7 +986,7 @@ def admin_github_delete():
     else:
         return jsonify({'success': False, 'error': 'delete_failed', 'detail': r2.text}), 500
 
-@app.route('/admin/github/delete_batch', methods=['POST'])
+@route('/admin/github/delete_batch', methods=['POST'])
 def admin_github_delete_batch():
     if not require_admin():
         return jsonify({'success': False, 'error': 'not_logged_in'}), 401
@@ -705,6 +1001,8 @@ def admin_github_delete_batch():
     if not GITHUB_TOKEN:
         return jsonify({'success': False, 'error': 'no_token_configured'}), 500
 
+    import requests
+
     results = []
     for path in paths:
         contents_url = f'https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={GITHUB_BRANCH}'
@@ -722,7 +1020,7 @@ def admin_github_delete_batch():
             results.append({'path': path, 'success': False, 'detail': r2.text})
     return jsonify({'success': True, 'results': results})
 
-@app.route('/admin/github/import', methods=['POST'])
+@route('/admin/github/import', methods=['POST'])
 def admin_github_import():
     """
     Import a file from the repo into runtime uploads and add gallery DB entry.
@@ -739,6 +1037,8 @@ def admin_github_import():
     if not owner:
         return jsonify({'success': False, 'error': 'no_repo_config'}), 500
 
+    import requests
+
     raw_url = f'https://raw.githubusercontent.com/{owner}/{repo}/{GITHUB_BRANCH}/{path}'
     try:
         r = requests.get(raw_url, timeout=20)
@@ -760,12 +1060,13 @@ def admin_github_import():
         new_id = c.lastrowid
         conn.close()
 
+        gallery_changed()
         return jsonify({'success': True, 'id': new_id, 'filename': new_name, 'caption': Path(path).name})
     except Exception as e:
         return jsonify({'success': False, 'error': 'exception', 'detail': str(e)}), 500
 
 # --- ADMIN: messages delete/export ---
-@app.route('/admin/messages/delete', methods=['POST'])
+@route('/admin/messages/delete', methods=['POST'])
 def admin_message_delete():
     if not require_admin():
         flash("Please log in to manage messages", "error")
@@ -782,8 +1083,12 @@ def admin_message_delete():
     flash("Message deleted", "success")
     return redirect(url_for('admin'))
 
-@app.route('/admin/messages/export', methods=['GET'])
+@route('/admin/messages/export', methods=['GET'])
 def admin_messages_export():
+    """
+    CSV export of messages. With ?archived=1 rows moved out by retention are included too,
+    optionally limited with ?since=YYYY-MM&until=YYYY-MM (archive months, inclusive).
+    """
     if not require_admin():
         flash("Please log in to export messages", "error")
         return redirect(url_for('admin'))
@@ -795,15 +1100,110 @@ def admin_messages_export():
     si = io.StringIO()
     cw = csv.writer(si)
     cw.writerow(['id','sender','text','filename','location','platform','timestamp'])
+    if request.args.get('archived') == '1':
+        archived = maintenance.iter_archived_messages(
+            ARCHIVE_DIR, request.args.get('since') or None, request.args.get('until') or None)
+        cw.writerows((r[0], r[1], r[3], r[4], r[6], r[7], r[8]) for r in archived)
     cw.writerows(rows)
     mem = io.BytesIO()
     mem.write(si.getvalue().encode('utf-8'))
     mem.seek(0)
     return send_file(mem, download_name='messages_export.csv', as_attachment=True)
 
+# --- ADMIN: maintenance (retention, archiving, compaction) ---
+def run_maintenance():
+    return maintenance.run_retention(CONTACTS_DB, ARCHIVE_DIR, RETENTION_DAYS)
+
+@route('/admin/maintenance/run', methods=['POST'])
+def admin_maintenance_run():
+    """
+    Run the retention/compaction job now. Returns its JSON report
+    (rows archived per platform and month, bytes reclaimed, checkpoint result).
+    """
+    if not require_admin():
+        return jsonify({'success': False, 'error': 'not_logged_in'}), 401
+    try:
+        report = maintenance.run_locked(MAINTENANCE_LOCK, run_maintenance)
+    except Exception as e:
+        print("maintenance: run failed:", e)
+        return jsonify({'success': False, 'error': 'maintenance_failed', 'detail': str(e)}), 500
+    if report is None:
+        return jsonify({'success': False, 'error': 'busy'}), 409
+    return jsonify({'success': True, 'report': report})
+
+# --- ADMIN: online database snapshots ---
+def snapshot_databases(keep=SNAPSHOT_KEEP):
+    reports = []
+    for db in (CONTACTS_DB, ADMIN_DB):
+        reports.append(backup.snapshot_db(db, SNAPSHOT_DIR, pages=SNAPSHOT_PAGES,
+                                          sleep=SNAPSHOT_SLEEP_MS / 1000, keep=keep))
+    return {'snapshots': reports}
+
+def restore_database(name):
+    """
+    Restore whichever database `name` was taken from, after snapshotting its current state.
+    Raises ValueError for names that are not an existing snapshot.
+    """
+    for db in (CONTACTS_DB, ADMIN_DB):
+        if name.startswith(backup.snapshot_prefix(db)):
+            # safety copy first; not rotated so the snapshot being restored can't be pruned
+            safety = backup.snapshot_db(db, SNAPSHOT_DIR, pages=SNAPSHOT_PAGES,
+                                        sleep=SNAPSHOT_SLEEP_MS / 1000, keep=None)
+            report = backup.restore_snapshot(SNAPSHOT_DIR, name, db)
+            report['safety_snapshot'] = safety['name']
+            return report
+    raise ValueError('unknown_snapshot')
+
+@route('/admin/snapshots', methods=['GET'])
+def admin_snapshots_list():
+    if not require_admin():
+        return jsonify({'success': False, 'error': 'not_logged_in'}), 401
+    return jsonify({'success': True, 'snapshots': backup.list_snapshots(SNAPSHOT_DIR)})
+
+@route('/admin/snapshots/create', methods=['POST'])
+def admin_snapshots_create():
+    """
+    Snapshot contacts.db and hithere.db now. Returns per-DB throughput and longest writer stall.
+    """
+    if not require_admin():
+        return jsonify({'success': False, 'error': 'not_logged_in'}), 401
+    try:
+        report = maintenance.run_locked(MAINTENANCE_LOCK, snapshot_databases)
+    except Exception as e:
+        print("snapshot failed:", e)
+        return jsonify({'success': False, 'error': 'snapshot_failed', 'detail': str(e)}), 500
+    if report is None:
+        return jsonify({'success': False, 'error': 'busy'}), 409
+    return jsonify({'success': True, **report})
+
+@route('/admin/snapshots/restore', methods=['POST'])
+def admin_snapshots_restore():
+    """
+    Restore a database from a snapshot. JSON body: {"name": "<snapshot file name>"}
+    """
+    if not require_admin():
+        return jsonify({'success': False, 'error': 'not_logged_in'}), 401
+    name = (request.get_json(silent=True) or {}).get('name')
+    if not name:
+        return jsonify({'success': False, 'error': 'missing_name'}), 400
+    try:
+        report = maintenance.run_locked(MAINTENANCE_LOCK, restore_database, name)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except Exception as e:
+        print("restore failed:", e)
+        return jsonify({'success': False, 'error': 'restore_failed', 'detail': str(e)}), 500
+    if report is None:
+        return jsonify({'success': False, 'error': 'busy'}), 409
+    if report['db'] == os.path.basename(CONTACTS_DB):
+        gallery_changed()
+    return jsonify({'success': True, **report})
+
 # --- KEEP-ALIVE thread ---
 # default changed to include the -z08v onrender URL you provided
 def keep_alive():
+    import requests
+
     url = os.getenv('KEEP_ALIVE_URL', 'https://jevicarn-christian-school-z08v.onrender.com')
     while True:
         try:
@@ -812,8 +1212,86 @@ def keep_alive():
             pass
         time.sleep(25)
 
+# --- APP FACTORY ---
+def precompile_templates(app):
+    """
+    Compile every template into the Jinja cache up front, so the first request per page
+    (and, under --preload, every worker) skips parsing.
+    """
+    env = app.jinja_env
+    names = env.list_templates(extensions=['html'])
+    if env.cache is not None and env.cache.capacity < len(names):
+        env.cache.capacity = len(names)
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+def register_commands(app):
+    @app.cli.command('maintain')
+    def maintain_command():
+        """Archive expired messages and compact contacts.db."""
+        report = maintenance.run_locked(MAINTENANCE_LOCK, run_maintenance)
+        print(json.dumps(report, indent=2) if report is not None else 'maintenance already running')
+
+    @app.cli.command('freeze')
+    def freeze_command():
+        """Render the public pages and fingerprinted assets into FROZEN_DIR."""
+        print(json.dumps(freeze.freeze_locked(app, FROZEN_DIR), indent=2))
+
+    @app.cli.command('snapshot')
+    def snapshot_command():
+        """Take online snapshots of contacts.db and hithere.db."""
+        report = maintenance.run_locked(MAINTENANCE_LOCK, snapshot_databases)
+        print(json.dumps(report, indent=2) if report is not None else 'maintenance already running')
+
+    @app.cli.command('restore-snapshot')
+    @click.argument('name')
+    def restore_snapshot_command(name):
+        """Restore a database from snapshot NAME (see /admin/snapshots)."""
+        report = maintenance.run_locked(MAINTENANCE_LOCK, restore_database, name)
+        print(json.dumps(report, indent=2) if report is not None else 'maintenance already running')
+
+def create_app():
+    app = Flask(__name__, template_folder="templates", static_folder=STATIC_FOLDER)
+    app.secret_key = os.getenv("FLASK_SECRET", "change-this-secret")
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view.__name__, view, **options)
+    register_commands(app)
+    init_storage()
+    precompile_templates(app)
+    if SERVE_FROZEN:
+        # build once at boot (the master, under --preload), then answer frozen URLs
+        # before the Flask request cycle; gallery edits trigger rebuilds
+        freeze.freeze_locked(app, FROZEN_DIR)
+        app.wsgi_app = freeze.FrozenSite(app.wsgi_app, FROZEN_DIR)
+    return app
+
+_scheduler_lock = None
+
+def start_scheduled_jobs():
+    """
+    Start the retention/snapshot scheduler in this process if any interval is set and no
+    other process runs it. Called from gunicorn's post_fork hook (gunicorn.conf.py), so the
+    jobs only ever run inside one worker, never in the master that forks them; a worker that
+    replaces a dead scheduler worker takes the lock over. Without an interval set, run
+    `flask maintain` / `flask snapshot` from cron instead.
+    """
+    global _scheduler_lock
+    jobs = []
+    if MAINTENANCE_INTERVAL_HOURS > 0:
+        jobs.append(('retention', MAINTENANCE_INTERVAL_HOURS * 3600, run_maintenance))
+    if SNAPSHOT_INTERVAL_HOURS > 0:
+        jobs.append(('snapshots', SNAPSHOT_INTERVAL_HOURS * 3600, snapshot_databases))
+    if not jobs or _scheduler_lock is not None:
+        return
+    _scheduler_lock = maintenance.hold_lock(SCHEDULER_LOCK)
+    if _scheduler_lock is not None:
+        maintenance.start_scheduler(jobs, MAINTENANCE_LOCK)
+
 # --- MAIN ---
 if __name__ == '__main__':
     if os.getenv('ENABLE_KEEP_ALIVE', '0') == '1':
         Thread(target=keep_alive, daemon=True).start()
-    app.run(debug=True, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
+    if os.getenv('WERKZEUG_RUN_MAIN') == 'true':   # the reloader's serving child, not its parent
+        start_scheduled_jobs()
+    create_app().run(debug=True, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+backup.py - gallery export/import as ZIP archives and online database snapshots
+(no Flask imports; app.py wires them up).
+
+Export is a generator: the ZIP is written member by member into a small buffer that is
+drained after every chunk, so memory stays flat however large static/uploads grows.
+Files that are already compressed (JPEG, PNG, WebP, GIF) are stored as-is; everything
+else is deflated. manifest.json (the gallery rows) is always the first member.
+
+Archive layout:
+    manifest.json          {"version": 1, "exported_at": ..., "gallery": [{filename, caption, created_at}, ...]}
+    uploads/<file>         files from static/uploads
+    gallery/<file>         files from static/gallery
+
+Snapshots use SQLite's online backup API so pulse/contact writers are never blocked for
+long (see snapshot_db). The copy is gzipped to
+<snapshot_dir>/<db name>-YYYYmmdd-HHMMSSffffff.db.gz and old snapshots are rotated.
+"""
+import gzip
+import io
+import json
+import os
+import posixpath
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+CHUNK_SIZE = 64 * 1024
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# formats that do not shrink under deflate; storing them saves CPU on export
+STORED_EXTS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile writes into and the generator drains."""
+
+    def __init__(self):
+        super().__init__()
+        self._buf = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buf += data
+        return len(data)
+
+    def drain(self):
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def _in_range(stamp, since, until):
+    # stamps and bounds are 'YYYY-MM-DD...' strings, so plain comparison orders them
+    day = (stamp or '')[:10]
+    if since and day < since:
+        return False
+    if until and day > until:
+        return False
+    return True
+
+def gallery_rows(db_path, since=None, until=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('SELECT filename, caption, created_at FROM gallery ORDER BY created_at, id').fetchall()
+    finally:
+        conn.close()
+    return [{'filename': r[0], 'caption': r[1], 'created_at': r[2]}
+            for r in rows if _in_range(r[2], since, until)]
+
+def export_members(folders, rows, since=None, until=None):
+    """
+    List (arcname, path) for every file to export. A file's date is its gallery row's
+    created_at when it has one, otherwise its mtime.
+    """
+    row_dates = {r['filename']: r['created_at'] for r in rows}
+    members = []
+    for prefix, folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+            if not entry.is_file():
+                continue
+            if prefix == 'uploads' and entry.name in row_dates:
+                stamp = row_dates[entry.name]
+            else:
+                stamp = datetime.utcfromtimestamp(entry.stat().st_mtime).strftime('%Y-%m-%d')
+            if _in_range(stamp, since, until):
+                members.append((f'{prefix}/{entry.name}', entry.path))
+    return members
+
+def stream_zip(manifest, members):
+    """
+    Yield the bytes of a ZIP archive holding manifest.json and `members` ((arcname, path) pairs).
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=1))
+        yield sink.drain()
+        for arcname, path in members:
+            try:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+            except OSError:
+                continue   # deleted since listing
+            ext = os.path.splitext(path)[1].lower()
+            info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTS else zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as src, zf.open(info, 'w') as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()   # central directory
+
+def export_gallery(db_path, folders, since=None, until=None):
+    """
+    Build the manifest and member list up front (cheap), then return the byte generator.
+    `folders` is [(prefix, directory), ...]; since/until are inclusive 'YYYY-MM-DD' bounds.
+    """
+    rows = gallery_rows(db_path, since, until)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'exported_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        'since': since,
+        'until': until,
+        'gallery': rows,
+    }
+    return stream_zip(manifest, export_members(folders, rows, since, until))
+
+def import_gallery(fileobj, db_path, folders, allowed_exts):
+    """
+    Extract an export archive into `folders` ({prefix: directory}) and bulk-insert its
+    manifest rows into gallery in one transaction. Only files whose extension is in
+    `allowed_exts` are extracted; anything else is reported as `bad_type`.
+    `fileobj` must be seekable (ZIP keeps its index at the end); werkzeug spools uploads
+    to a temp file, so members are copied to disk chunk by chunk without loading the archive.
+    Existing files and gallery rows with the same filename are left alone. A manifest row
+    is only inserted if it names a plain file of an allowed type that exists in the
+    `uploads` folder after extraction; other rows are reported in `errors`.
+    Returns a summary dict.
+    """
+    summary = {'files_written': 0, 'files_skipped': 0, 'rows_inserted': 0, 'rows_skipped': 0, 'errors': []}
+    with zipfile.ZipFile(fileobj) as zf:
+        try:
+            manifest = json.loads(zf.read(MANIFEST_NAME).decode('utf-8'))
+        except KeyError:
+            raise ValueError('missing_manifest')
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError('bad_manifest_version')
+
+        for info in zf.infolist():
+            if info.is_dir() or info.filename == MANIFEST_NAME:
+                continue
+            prefix, _, name = info.filename.partition('/')
+            # flat folders only: reject nesting, traversal and hidden files
+            if prefix not in folders or not name or name.startswith('.') \
+                    or posixpath.basename(name) != name or os.path.basename(name) != name:
+                summary['errors'].append({'name': info.filename, 'error': 'bad_path'})
+                continue
+            if os.path.splitext(name)[1].lower() not in allowed_exts:
+                summary['errors'].append({'name': info.filename, 'error': 'bad_type'})
+                continue
+            dest = os.path.join(folders[prefix], name)
+            if os.path.exists(dest):
+                summary['files_skipped'] += 1
+                continue
+            tmp = dest + '.part'
+            try:
+                with zf.open(info) as src, open(tmp, 'wb') as out:
+                    shutil.copyfileobj(src, out, CHUNK_SIZE)
+                os.replace(tmp, dest)
+                summary['files_written'] += 1
+            except Exception as e:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                summary['errors'].append({'name': info.filename, 'error': str(e)})
+
+    rows = []
+    upload_dir = folders.get('uploads')
+    for r in manifest.get('gallery') or []:
+        name = r.get('filename') if isinstance(r, dict) else None
+        if not isinstance(name, str) or not name or name.startswith('.') \
+                or posixpath.basename(name) != name or os.path.basename(name) != name \
+                or os.path.splitext(name)[1].lower() not in allowed_exts:
+            summary['errors'].append({'name': str(name), 'error': 'bad_row'})
+        elif not upload_dir or not os.path.isfile(os.path.join(upload_dir, name)):
+            summary['errors'].append({'name': name, 'error': 'missing_file'})
+        else:
+            rows.append(r)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            existing = {r[0] for r in conn.execute('SELECT filename FROM gallery')}
+            fresh = []
+            for r in rows:
+                if r['filename'] in existing:
+                    continue
+                existing.add(r['filename'])
+                fresh.append((r['filename'], r.get('caption') or '', r.get('created_at')))
+            conn.executemany(
+                'INSERT INTO gallery (filename, caption, created_at) '
+                'VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))', fresh)
+    finally:
+        conn.close()
+    summary['rows_inserted'] = len(fresh)
+    summary['rows_skipped'] = len(rows) - len(fresh)
+    return summary
+
+
+# --- online database snapshots ---
+SNAPSHOT_SUFFIX = '.db.gz'
+
+def snapshot_prefix(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0] + '-'
+
+def list_snapshots(snapshot_dir, db_path=None):
+    """
+    Snapshots newest first as dicts (name, db, size, created). Limited to one DB if given.
+    """
+    if not os.path.isdir(snapshot_dir):
+        return []
+    prefix = snapshot_prefix(db_path) if db_path else ''
+    snaps = []
+    for entry in os.scandir(snapshot_dir):
+        if not entry.is_file() or not entry.name.endswith(SNAPSHOT_SUFFIX) or not entry.name.startswith(prefix):
+            continue
+        parts = entry.name[:-len(SNAPSHOT_SUFFIX)].rsplit('-', 2)
+        if len(parts) != 3:
+            continue
+        db_name, day, clock = parts
+        try:
+            created = datetime.strptime(day + clock, '%Y%m%d%H%M%S%f')
+        except ValueError:
+            continue
+        snaps.append((created, {
+            'name': entry.name,
+            'db': db_name + '.db',
+            'size': entry.stat().st_size,
+            'created': created.strftime('%Y-%m-%d %H:%M:%S'),
+        }))
+    snaps.sort(key=lambda s: s[0], reverse=True)
+    return [snap for _, snap in snaps]
+
+class _TooManyRestarts(Exception):
+    pass
+
+def _backup_stepped(src, dst, pages, sleep, max_restarts, stats):
+    """
+    Run src.backup in `pages`-sized steps with a `sleep` pause between them, accumulating
+    steps, restarts and the longest step (ms) into `stats`. Raises _TooManyRestarts if
+    other connections keep invalidating the copy.
+    """
+    stats['remaining'] = None
+    mark = [time.perf_counter()]
+
+    def progress(status, remaining, total):
+        # time spent inside sqlite3_backup_step, i.e. while the source lock was held
+        stats['max_step_ms'] = max(stats['max_step_ms'], (time.perf_counter() - mark[0]) * 1000)
+        if stats['remaining'] is not None and remaining > stats['remaining']:
+            stats['restarts'] += 1    # another connection wrote; SQLite restarted the copy
+            if stats['restarts'] > max_restarts:
+                raise _TooManyRestarts()
+        stats['remaining'] = remaining
+        stats['steps'] += 1
+        # backup()'s own `sleep` only applies after SQLITE_BUSY/LOCKED, so pause here:
+        # the source lock is released between steps, which is when writers get in
+        if remaining > 0 and sleep:
+            time.sleep(sleep)
+        mark[0] = time.perf_counter()
+
+    src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+
+def snapshot_db(db_path, snapshot_dir, pages=64, sleep=0.005, keep=7, max_restarts=20):
+    """
+    Copy a live database with the online backup API, gzip it and rotate old copies.
+    Keeps the `keep` newest snapshots per database (None = no rotation).
+
+    Rollback-journal databases are copied `pages` pages per step with a `sleep` between
+    steps, so a writer waits at most one step. A write from another connection makes
+    SQLite restart the copy; after `max_restarts` restarts the rest is copied in one step.
+    WAL databases are copied in one step: the copy is only a reader there (it reads a
+    snapshot of the main file plus WAL while writers keep appending to the WAL), so writers
+    never wait on it and stepping would just invite restarts.
+
+    Returns a report with throughput, the longest measured backup step (`max_step_ms`) and
+    `max_writer_stall_ms`: the longest step for rollback-journal databases, where each step
+    holds the lock writers need, and None for WAL databases, where no step blocks a writer.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S%f')
+    name = f'{snapshot_prefix(db_path)}{stamp}{SNAPSHOT_SUFFIX}'
+    final = os.path.join(snapshot_dir, name)
+
+    fd, raw_path = tempfile.mkstemp(prefix='.snap-', suffix='.db', dir=snapshot_dir)
+    os.close(fd)
+    try:
+        src = sqlite3.connect(db_path, timeout=30)
+        dst = sqlite3.connect(raw_path)
+        stats = {'steps': 0, 'restarts': 0, 'max_step_ms': 0.0}
+        started = time.perf_counter()
+        try:
+            journal_mode = src.execute('PRAGMA journal_mode').fetchone()[0].lower()
+            if journal_mode == 'wal':
+                _backup_stepped(src, dst, -1, 0, 0, stats)
+            else:
+                try:
+                    _backup_stepped(src, dst, pages, sleep, max_restarts, stats)
+                except _TooManyRestarts:
+                    _backup_stepped(src, dst, -1, 0, 0, stats)
+        finally:
+            dst.close()
+            src.close()
+        copy_s = time.perf_counter() - started
+        raw_size = os.path.getsize(raw_path)
+
+        with open(raw_path, 'rb') as fin, gzip.open(final + '.part', 'wb', compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+        os.replace(final + '.part', final)
+    finally:
+        for leftover in (raw_path, final + '.part'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    rotated = []
+    for old in (list_snapshots(snapshot_dir, db_path)[keep:] if keep else []):
+        os.remove(os.path.join(snapshot_dir, old['name']))
+        rotated.append(old['name'])
+
+    return {
+        'name': name,
+        'journal_mode': journal_mode,
+        'db_bytes': raw_size,
+        'snapshot_bytes': os.path.getsize(final),
+        'copy_ms': round(copy_s * 1000, 1),
+        'throughput_mb_s': round(raw_size / copy_s / 1e6, 2) if copy_s else None,
+        'steps': stats['steps'],
+        'restarts': stats['restarts'],
+        'max_step_ms': round(stats['max_step_ms'], 2),
+        'max_writer_stall_ms': None if journal_mode == 'wal' else round(stats['max_step_ms'], 2),
+        'rotated': rotated,
+    }
+
+def restore_snapshot(snapshot_dir, name, db_path):
+    """
+    Restore `db_path` in place from snapshot `name` (must belong to that database).
+    Uses the backup API in reverse as a single step, so readers never see a half-restored
+    file and open connections simply pick up the new contents.
+    """
+    if name not in {s['name'] for s in list_snapshots(snapshot_dir, db_path)}:
+        raise ValueError('unknown_snapshot')
+    fd, raw_path = tempfile.mkstemp(prefix='.restore-', suffix='.db', dir=snapshot_dir)
+    os.close(fd)
+    try:
+        with gzip.open(os.path.join(snapshot_dir, name), 'rb') as fin, open(raw_path, 'wb') as fout:
+            shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+        src = sqlite3.connect(raw_path)
+        dst = sqlite3.connect(db_path, timeout=30)
+        started = time.perf_counter()
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        return {'name': name, 'db': os.path.basename(db_path),
+                'restore_ms': round((time.perf_counter() - started) * 1000, 1)}
+    finally:
+        os.remove(raw_path)
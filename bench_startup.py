@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py - measure cold boot of the site: import app -> create_app() -> first response.
+Each run is a fresh interpreter with throwaway databases, i.e. what a new gunicorn worker
+(without --preload) or a Render cold start pays before it can answer.
+
+Usage: python bench_startup.py [runs] [path]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import app as site
+t1 = time.perf_counter()
+flask_app = site.create_app()
+t2 = time.perf_counter()
+resp = flask_app.test_client().get(sys.argv[1])
+t3 = time.perf_counter()
+print(json.dumps({
+    'status': resp.status_code,
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_response_ms': (t3 - t2) * 1000,
+    'total_ms': (t3 - t0) * 1000,
+    'requests_loaded': 'requests' in sys.modules,
+}))
+'''
+
+def run_once(path):
+    # new databases every run, so each one pays the schema creation a cold start pays
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(os.environ,
+                   CONTACTS_DB=os.path.join(tmpdir, 'contacts.db'),
+                   ADMIN_DB=os.path.join(tmpdir, 'hithere.db'),
+                   PYTHONDONTWRITEBYTECODE='1')
+        out = subprocess.run([sys.executable, '-c', CHILD, path], cwd=HERE, env=env,
+                             capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    path = sys.argv[2] if len(sys.argv) > 2 else '/gallery'
+    results = [run_once(path) for _ in range(runs)]
+
+    print(f"startup benchmark: GET {path}, {runs} cold runs (status {results[-1]['status']}, "
+          f"requests imported at boot: {results[-1]['requests_loaded']})")
+    for key in ('import_ms', 'create_app_ms', 'first_response_ms', 'total_ms'):
+        vals = [r[key] for r in results]
+        print(f"  {key:<18} median {statistics.median(vals):8.1f}   min {min(vals):8.1f}   max {max(vals):8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+freeze.py - render the public pages to static files and serve them without Flask.
+
+freeze() requests splash, home, programs and gallery (plus every /api/gallery page) through
+the app's test client, rewrites /static/... references to content-hashed copies and writes
+everything under an output directory:
+
+    index.html, home/index.html, programs/index.html, gallery/index.html
+    api/gallery/page-<n>.json          gallery pages 2..n, chained through their `next` field
+    static/<dir>/<name>.<hash><ext>    fingerprinted assets (safe to cache forever)
+    manifest.json                      URL -> file map used by FrozenSite
+
+The directory can be served by any static file server, or by FrozenSite, a WSGI
+middleware that answers those URLs before the Flask request cycle starts. contact,
+pulse_receiver and the admin routes are never frozen and fall through to Flask.
+
+Rebuilds are incremental: asset hashes are cached by (mtime, size), hashed copies are only
+written once, and pages are only rewritten when their bytes change.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from urllib.parse import quote, unquote
+
+from werkzeug.wsgi import wrap_file
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: builds just run unlocked
+    fcntl = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# URL -> output file. '/index.html' is the home page in the app, but index.html on disk
+# has to be the splash page for plain static servers; FrozenSite maps it via the manifest.
+PAGES = {
+    '/': 'index.html',
+    '/home': 'home/index.html',
+    '/index.html': 'home/index.html',
+    '/programs': 'programs/index.html',
+    '/gallery': 'gallery/index.html',
+}
+GALLERY_API = '/api/gallery'
+API_PAGE = 'api/gallery/page-{n}.json'
+API_PAGE_FILE = re.compile(r'page-(\d+)\.json$')
+
+STATIC_REF = re.compile(r'/static/([^"\'()\s?#<>]+)')
+
+# set on the freezer's own requests so FrozenSite never answers them from the old build
+BYPASS_KEY = 'freeze.bypass'
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.bmp': 'image/bmp',
+    '.tiff': 'image/tiff',
+    '.ico': 'image/x-icon',
+    '.svg': 'image/svg+xml',
+}
+
+
+def _write_if_changed(path, data):
+    """Atomically write bytes unless the file already holds them. Returns True if written."""
+    try:
+        with open(path, 'rb') as fh:
+            if fh.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.part'
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+    return True
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+def _content_type(path):
+    return CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+
+
+class _AssetStore:
+    """Copies referenced static files to fingerprinted names inside the output directory."""
+
+    def __init__(self, static_folder, out_dir, cache):
+        self.static_folder = static_folder
+        self.static_root = os.path.realpath(static_folder)
+        self.out_dir = out_dir
+        self.cache = cache        # rel path -> [mtime_ns, size, hashed rel path]
+        self.used = {}            # rel path -> hashed rel path, for this build
+        self.copied = 0
+
+    def fingerprint(self, rel):
+        if rel in self.used:
+            return self.used[rel]
+        src = os.path.realpath(os.path.join(self.static_folder, rel))
+        if os.path.commonpath([src, self.static_root]) != self.static_root:
+            return None           # ../ or a symlink leading out of static/: never copy it
+        try:
+            st = os.stat(src)
+        except OSError:
+            return None           # broken reference; leave the URL alone
+        cached = self.cache.get(rel)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            hashed = cached[2]
+        else:
+            digest = hashlib.blake2b(digest_size=6)
+            with open(src, 'rb') as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            stem, ext = os.path.splitext(os.path.relpath(src, self.static_root).replace(os.sep, '/'))
+            hashed = f'{stem}.{digest.hexdigest()}{ext}'
+            self.cache[rel] = [st.st_mtime_ns, st.st_size, hashed]
+        dest = os.path.join(self.out_dir, 'static', hashed)
+        if not os.path.exists(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copy2(src, dest + '.part')
+            os.replace(dest + '.part', dest)
+            self.copied += 1
+        self.used[rel] = hashed
+        return hashed
+
+    def rewrite(self, text):
+        def swap(match):
+            hashed = self.fingerprint(unquote(match.group(1)))
+            return '/static/' + quote(hashed) if hashed else match.group(0)
+        return STATIC_REF.sub(swap, text)
+
+    def prune(self):
+        """Delete fingerprinted files no longer referenced. Returns the count removed."""
+        keep = {os.path.normpath(os.path.join(self.out_dir, 'static', h)) for h in self.used.values()}
+        removed = 0
+        for root, _, files in os.walk(os.path.join(self.out_dir, 'static')):
+            for name in files:
+                path = os.path.normpath(os.path.join(root, name))
+                if path not in keep:
+                    os.remove(path)
+                    removed += 1
+        self.cache = {rel: v for rel, v in self.cache.items() if rel in self.used}
+        return removed
+
+
+def freeze(app, out_dir):
+    """
+    Render the public pages of `app` into `out_dir`. Returns a report dict.
+    """
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    previous = _load_manifest(out_dir)
+    assets = _AssetStore(app.static_folder, out_dir, previous.get('assets', {}))
+    client = app.test_client()
+    client.environ_base[BYPASS_KEY] = True
+    routes = {}
+    written = 0
+
+    # gallery API pages: page 1 is inlined in gallery.html; 2..n become JSON files
+    api_pages = []
+    url = GALLERY_API
+    while url:
+        resp = client.get(url)
+        if resp.status_code != 200:
+            raise RuntimeError(f'freeze: GET {url} returned {resp.status_code}')
+        data = resp.get_json()
+        api_pages.append((url, data))
+        url = data.get('next')
+    api_urls = {u: '/' + API_PAGE.format(n=i + 1) for i, (u, _) in enumerate(api_pages) if i}
+
+    def relink(text):
+        # longest first so a URL is never clobbered by a prefix of another
+        for dynamic in sorted(api_urls, key=len, reverse=True):
+            text = text.replace(dynamic, api_urls[dynamic])
+        return assets.rewrite(text)
+
+    for i, (_, data) in enumerate(api_pages[1:], start=2):
+        rel = API_PAGE.format(n=i)
+        body = relink(json.dumps(data, ensure_ascii=False, separators=(',', ':'))).encode('utf-8')
+        written += _write_if_changed(os.path.join(out_dir, rel), body)
+        routes['/' + rel] = {'file': rel, 'etag': hashlib.blake2b(body, digest_size=8).hexdigest()}
+
+    # a shrunken gallery leaves old page files behind; plain static servers would keep serving them
+    api_pruned = 0
+    api_dir = os.path.join(out_dir, os.path.dirname(API_PAGE))
+    if os.path.isdir(api_dir):
+        for name in os.listdir(api_dir):
+            match = API_PAGE_FILE.match(name)
+            if match and int(match.group(1)) > len(api_pages):
+                os.remove(os.path.join(api_dir, name))
+                api_pruned += 1
+
+    rendered = {}   # rel -> route, so aliases like /index.html render once
+    for url, rel in PAGES.items():
+        if rel not in rendered:
+            resp = client.get(url)
+            if resp.status_code != 200:
+                raise RuntimeError(f'freeze: GET {url} returned {resp.status_code}')
+            body = relink(resp.get_data(as_text=True)).encode('utf-8')
+            written += _write_if_changed(os.path.join(out_dir, rel), body)
+            rendered[rel] = {'file': rel, 'etag': hashlib.blake2b(body, digest_size=8).hexdigest()}
+        routes[url] = rendered[rel]
+
+    for hashed in assets.used.values():
+        routes['/static/' + quote(hashed)] = {'file': 'static/' + hashed, 'immutable': True}
+
+    pruned = assets.prune()
+    manifest = {
+        'built_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+        'routes': routes,
+        'assets': assets.cache,
+    }
+    _write_if_changed(os.path.join(out_dir, MANIFEST_NAME),
+                      json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    return {
+        'pages': len(rendered),
+        'api_pages': max(len(api_pages) - 1, 0),
+        'api_pages_pruned': api_pruned,
+        'files_written': written,
+        'assets': len(assets.used),
+        'assets_copied': assets.copied,
+        'assets_pruned': pruned,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+def freeze_locked(app, out_dir):
+    """freeze() serialised across processes, so two workers never interleave a build."""
+    if fcntl is None:
+        return freeze(app, out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, '.lock'), 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            return freeze(app, out_dir)
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+# --- debounced rebuilds after gallery edits ---
+_pending = None
+_pending_lock = threading.Lock()
+
+def request_freeze(app, out_dir, delay=0.5):
+    """
+    Rebuild in the background shortly after the last call, so a burst of uploads
+    (e.g. a batch of parallel requests) costs one freeze.
+    """
+    global _pending
+
+    def run():
+        try:
+            report = freeze_locked(app, out_dir)
+            print(f"[FREEZE] rebuilt: {report}")
+        except Exception as e:
+            print("[FREEZE] rebuild failed:", e)
+
+    with _pending_lock:
+        if _pending is not None:
+            _pending.cancel()
+        _pending = threading.Timer(delay, run)
+        _pending.daemon = True
+        _pending.start()
+
+
+# --- WSGI fast path ---
+class FrozenSite:
+    """
+    WSGI middleware serving frozen URLs straight from disk; anything else (query strings,
+    POSTs, contact, admin, ...) goes to the wrapped Flask app. The manifest is re-read
+    when a rebuild replaces it, so every worker picks up new builds.
+    """
+
+    def __init__(self, wsgi_app, out_dir):
+        self.wsgi_app = wsgi_app
+        self.out_dir = out_dir
+        self._manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+        self._stamp = None
+        self._routes = {}
+        self._bodies = {}
+
+    def _refresh(self):
+        try:
+            stamp = os.stat(self._manifest_path).st_mtime_ns
+        except OSError:
+            self._stamp, self._routes, self._bodies = None, {}, {}
+            return
+        if stamp != self._stamp:
+            self._routes = _load_manifest(self.out_dir).get('routes', {})
+            self._bodies = {}
+            self._stamp = stamp
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') in ('GET', 'HEAD') and not environ.get('QUERY_STRING') \
+                and not environ.get(BYPASS_KEY):
+            self._refresh()
+            route = self._routes.get(environ.get('PATH_INFO', ''))
+            if route:
+                served = self._serve(route, environ, start_response)
+                if served is not None:
+                    return served
+        return self.wsgi_app(environ, start_response)
+
+    def _serve(self, route, environ, start_response):
+        path = os.path.join(self.out_dir, route['file'])
+        headers = [('Content-Type', _content_type(path))]
+        if route.get('immutable'):
+            headers.append(('Cache-Control', 'public, max-age=31536000, immutable'))
+            try:
+                fh = open(path, 'rb')
+            except OSError:
+                return None
+            headers.append(('Content-Length', str(os.fstat(fh.fileno()).st_size)))
+            start_response('200 OK', headers)
+            if environ['REQUEST_METHOD'] == 'HEAD':
+                fh.close()
+                return [b'']
+            return wrap_file(environ, fh, 64 * 1024)
+
+        etag = f'"{route["etag"]}"'
+        headers += [('Cache-Control', 'no-cache'), ('ETag', etag)]
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            start_response('304 Not Modified', headers)
+            return [b'']
+        body = self._bodies.get(path)
+        if body is None:
+            try:
+                with open(path, 'rb') as fh:
+                    body = fh.read()
+            except OSError:
+                return None
+            self._bodies[path] = body
+        headers.append(('Content-Length', str(len(body))))
+        start_response('200 OK', headers)
+        return [b''] if environ['REQUEST_METHOD'] == 'HEAD' else [body]
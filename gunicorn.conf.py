@@ -0,0 +1,6 @@
+# gunicorn picks this file up automatically from the working directory.
+# The app is preloaded in the master (see Procfile); background jobs start after fork.
+
+def post_fork(server, worker):
+    import app
+    app.start_scheduled_jobs()
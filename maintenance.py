@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+maintenance.py - housekeeping jobs for the site databases (no Flask imports; app.py wires them up).
+
+Retention: messages older than a per-platform age limit are moved out of contacts.db into
+monthly archive files (archive/messages-YYYY-MM.db). Each archive file holds a plain
+`messages` table with the same columns, so any sqlite client can ATTACH it read-only and
+query it directly (see iter_archived_messages). Per-row compression was tried and dropped:
+pulse payloads are a few dozen bytes and grew under zlib.
+
+Compaction: contacts.db is switched to incremental auto_vacuum once, then each run frees
+the pages left behind by deletes and truncates the WAL, reporting the bytes reclaimed.
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from threading import Thread
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: jobs just run unlocked
+    fcntl = None
+
+ARCHIVE_PREFIX = 'messages-'
+ARCHIVE_BATCH_ROWS = 5000
+
+MESSAGE_COLUMNS = ('id', 'sender', 'receiver', 'text', 'filename', 'seen', 'location', 'platform', 'timestamp')
+
+
+# --- config ---
+def parse_retention(spec):
+    """
+    Parse a retention spec like "pulse=30,*=365" into {platform: days}.
+    `*` applies to every platform not named explicitly (including contact-form rows with
+    no platform). A missing or 0 limit means rows are kept forever.
+    """
+    limits = {}
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        key, sep, days = part.partition('=')
+        if not sep:
+            raise ValueError(f'bad retention entry: {part!r}')
+        days = int(days)
+        if days > 0:
+            limits[key.strip()] = days
+    return limits
+
+
+# --- sizes ---
+def db_footprint(db_path):
+    """Bytes on disk for a database including its WAL."""
+    total = 0
+    for path in (db_path, db_path + '-wal'):
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+# --- archiving ---
+def archive_path(archive_dir, month):
+    return os.path.join(archive_dir, f'{ARCHIVE_PREFIX}{month}.db')
+
+def ensure_archive_schema(conn, schema='arc'):
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {schema}.messages (
+        id INTEGER PRIMARY KEY,
+        sender TEXT,
+        receiver TEXT,
+        text TEXT,
+        filename TEXT,
+        seen INTEGER,
+        location TEXT,
+        platform TEXT,
+        timestamp DATETIME
+    )''')
+
+def retention_clauses(limits, now=None):
+    """
+    Build (label, sql, params) filters selecting expired rows, one per retention rule.
+    """
+    now = now or datetime.utcnow()
+    clauses = []
+    named = [p for p in limits if p != '*']
+    for platform, days in limits.items():
+        cutoff = (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        if platform == '*':
+            if named:
+                marks = ','.join('?' * len(named))
+                sql = f'(platform IS NULL OR platform NOT IN ({marks})) AND timestamp < ?'
+                params = (*named, cutoff)
+            else:
+                sql, params = 'timestamp < ?', (cutoff,)
+        else:
+            sql, params = 'platform = ? AND timestamp < ?', (platform, cutoff)
+        clauses.append((platform, sql, params))
+    return clauses
+
+def month_bounds(month):
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')
+
+def archive_expired(db_path, archive_dir, limits, now=None):
+    """
+    Move expired messages into monthly archive files.
+    Each batch is copied (INSERT OR IGNORE) and committed to the archive before it is
+    deleted from contacts.db in a second transaction, so a run that dies half-way can
+    simply be repeated. Returns {"<platform> <YYYY-MM>": rows moved}.
+    """
+    moved = {}
+    if not limits:
+        return moved
+    os.makedirs(archive_dir, exist_ok=True)
+    cols = ', '.join(MESSAGE_COLUMNS)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        for label, where, params in retention_clauses(limits, now):
+            months = [r[0] for r in conn.execute(
+                f"SELECT DISTINCT strftime('%Y-%m', timestamp) FROM messages WHERE {where}", params)
+                if r[0]]
+            for month in sorted(months):
+                start, end = month_bounds(month)
+                conn.execute('ATTACH DATABASE ? AS arc', (archive_path(archive_dir, month),))
+                try:
+                    ensure_archive_schema(conn)
+                    conn.commit()
+                    total = 0
+                    while True:
+                        ids = [r[0] for r in conn.execute(
+                            f'SELECT id FROM messages WHERE {where} AND timestamp >= ? AND timestamp < ? '
+                            f'ORDER BY id LIMIT ?', (*params, start, end, ARCHIVE_BATCH_ROWS))]
+                        if not ids:
+                            break
+                        marks = ','.join('?' * len(ids))
+                        # two transactions on purpose: with main in WAL mode a commit spanning
+                        # ATTACHed files is not atomic, so the archive copy must be durable
+                        # before the originals are deleted
+                        with conn:
+                            conn.execute(
+                                f'INSERT OR IGNORE INTO arc.messages ({cols}) SELECT {cols} '
+                                f'FROM main.messages WHERE id IN ({marks})', ids)
+                        with conn:
+                            conn.execute(f'DELETE FROM main.messages WHERE id IN ({marks})', ids)
+                        total += len(ids)
+                    if total:
+                        conn.execute('VACUUM arc')
+                        moved[f'{label} {month}'] = total
+                finally:
+                    conn.execute('DETACH DATABASE arc')
+    finally:
+        conn.close()
+    return moved
+
+def archive_months(archive_dir):
+    if not os.path.isdir(archive_dir):
+        return []
+    months = []
+    for name in os.listdir(archive_dir):
+        if name.startswith(ARCHIVE_PREFIX) and name.endswith('.db'):
+            months.append(name[len(ARCHIVE_PREFIX):-len('.db')])
+    return sorted(months)
+
+def iter_archived_messages(archive_dir, since=None, until=None):
+    """
+    Yield archived message rows (MESSAGE_COLUMNS order), oldest month first.
+    `since` / `until` are inclusive 'YYYY-MM' bounds. Each partition is attached read-only
+    in turn, so any number of months can be read without hitting SQLite's attach limit.
+    """
+    conn = sqlite3.connect('file::memory:', uri=True)
+    try:
+        for month in archive_months(archive_dir):
+            if (since and month < since) or (until and month > until):
+                continue
+            uri = 'file:' + os.path.abspath(archive_path(archive_dir, month)) + '?mode=ro'
+            conn.execute('ATTACH DATABASE ? AS arc', (uri,))
+            try:
+                cols = ', '.join(MESSAGE_COLUMNS)
+                yield from conn.execute(f'SELECT {cols} FROM arc.messages ORDER BY id')
+            finally:
+                conn.execute('DETACH DATABASE arc')
+    finally:
+        conn.close()
+
+
+# --- compaction ---
+def compact(db_path):
+    """
+    Return free pages to the filesystem and truncate the WAL.
+    The first run converts the file to incremental auto_vacuum (needs one full VACUUM).
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        free_before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        else:
+            # executescript steps the pragma to completion; execute() would stop after the
+            # first step, which frees a single page
+            conn.executescript('PRAGMA incremental_vacuum;')
+        busy, wal_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        free_after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        'free_pages_before': free_before,
+        'free_pages_after': free_after,
+        'checkpoint': {'busy': bool(busy), 'wal_pages': wal_pages, 'checkpointed': checkpointed},
+    }
+
+def run_retention(db_path, archive_dir, limits, now=None):
+    """
+    Full maintenance pass for contacts.db: archive expired rows, then compact.
+    Returns a JSON-serialisable report.
+    """
+    started = time.perf_counter()
+    bytes_before = db_footprint(db_path)
+    moved = archive_expired(db_path, archive_dir, limits, now)
+    compaction = compact(db_path)
+    bytes_after = db_footprint(db_path)
+    return {
+        'archived': moved,
+        'rows_archived': sum(moved.values()),
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'bytes_reclaimed': max(bytes_before - bytes_after, 0),
+        'compaction': compaction,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+# --- scheduling ---
+def run_locked(lock_path, fn, *args, **kwargs):
+    """
+    Run fn unless another process holds the maintenance lock; returns None if skipped.
+    Keeps jobs single-instance when every gunicorn worker runs its own scheduler.
+    """
+    if fcntl is None:
+        return fn(*args, **kwargs)
+    with open(lock_path, 'a') as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return None
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def hold_lock(lock_path):
+    """
+    Take an exclusive lock for the rest of the process's life. Returns the open file
+    (keep a reference to it) or None if another process already holds the lock.
+    """
+    fh = open(lock_path, 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return None
+    return fh
+
+def start_scheduler(jobs, lock_path, tick=60):
+    """
+    Start a daemon thread running each (name, interval_seconds, fn) job when it falls due.
+    """
+    def loop():
+        due = {name: time.monotonic() + interval for name, interval, _ in jobs}
+        while True:
+            time.sleep(tick)
+            for name, interval, fn in jobs:
+                if time.monotonic() < due[name]:
+                    continue
+                due[name] = time.monotonic() + interval
+                try:
+                    report = run_locked(lock_path, fn)
+                    if report is not None:
+                        print(f"[MAINTENANCE] {name}: {report}")
+                except Exception as e:
+                    print(f"[MAINTENANCE] {name} failed:", e)
+
+    thread = Thread(target=loop, name='maintenance', daemon=True)
+    thread.start()
+    return thread
@@ -1,40 +1,75 @@
-const galleryImages = document.querySelectorAll('.gallery-item img');
-const lightbox = document.getElementById('lightbox');
-const lightboxImg = lightbox.querySelector('img');
-const closeBtn = lightbox.querySelector('.close-btn');
-const leftArrow = lightbox.querySelector('.nav-arrow.left');
-const rightArrow = lightbox.querySelector('.nav-arrow.right');
-
-let currentIndex = 0;
-
-// Open lightbox
-galleryImages.forEach((img, index) => {
-  img.addEventListener('click', () => {
-    currentIndex = index;
-    showImage();
-    lightbox.style.display = 'flex';
+/* -------------------------
+  Gallery page JS
+   - only the first page of thumbnails is rendered server-side
+   - further pages come from /api/gallery (or a frozen copy) when the sentinel scrolls into view,
+     always following the `next` URL the previous page handed out
+   - the viewer in base.html (window.__JevicarnViewer) opens the images; stepping past the last
+     loaded one calls loadMore() through its hooks
+---------------------------*/
+(function(){
+  const grid = document.querySelector('.gallery-preview .grid[data-api]');
+  if(!grid) return;
+
+  const sentinel = document.getElementById('gallery-sentinel');
+  const viewer = window.__JevicarnViewer;
+
+  let nextUrl = grid.dataset.nextUrl || '';
+  let pending = null;   // in-flight page request, shared by the observer and the viewer
+
+  function addThumb(item){
+    const index = grid.querySelectorAll('.thumb img').length;
+
+    const thumb = document.createElement('div');
+    thumb.className = 'thumb';
+    thumb.setAttribute('role', 'button');
+    thumb.setAttribute('tabindex', '0');
+    thumb.setAttribute('aria-label', `Open image ${index + 1}`);
+    const img = document.createElement('img');
+    img.src = item.src;
+    img.alt = item.alt || '';
+    img.loading = 'lazy';
+    img.dataset.filename = item.path;
+    img.dataset.index = String(index);
+    img.style.touchAction = 'none';
+    img.setAttribute('role', 'button');
+    thumb.appendChild(img);
+    grid.insertBefore(thumb, sentinel);
+  }
+
+  /* fetch the next page; resolves true if new items were appended */
+  function loadMore(){
+    if(pending) return pending;
+    if(!nextUrl) return Promise.resolve(false);
+    pending = fetch(nextUrl, { headers: { 'Accept': 'application/json' } })
+      .then(res => res.ok ? res.json() : Promise.reject(new Error(`HTTP ${res.status}`)))
+      .then(data => {
+        (data.items || []).forEach(addThumb);
+        nextUrl = data.next || '';
+        if(!nextUrl && observer) observer.disconnect();
+        return (data.items || []).length > 0;
+      })
+      .catch(err => { console.error('gallery: page load failed', err); return false; })
+      .finally(() => { pending = null; });
+    return pending;
+  }
+
+  // the grid scrolls horizontally, so watch the sentinel relative to the grid itself
+  const observer = ('IntersectionObserver' in window && sentinel && nextUrl)
+    ? new IntersectionObserver(entries => {
+        if(entries.some(e => e.isIntersecting)) loadMore();
+      }, { root: grid, rootMargin: '0px 600px 0px 600px' })
+    : null;
+  if(observer) observer.observe(sentinel);
+
+  if(!viewer) return;
+  viewer.hooks.loadMore = loadMore;
+
+  // clicks are delegated by the viewer itself; add keyboard opening for focused thumbnails
+  grid.addEventListener('keydown', e => {
+    const thumb = e.target.closest('.thumb');
+    if(!thumb || (e.key !== 'Enter' && e.key !== ' ')) return;
+    e.preventDefault();
+    const img = thumb.querySelector('img');
+    viewer.openAt(Array.from(grid.querySelectorAll('.thumb img')).indexOf(img));
   });
-});
-
-// Close lightbox
-closeBtn.addEventListener('click', () => lightbox.style.display = 'none');
-lightbox.addEventListener('click', e => {
-  if (e.target === lightbox) lightbox.style.display = 'none';
-});
-
-// Navigate
-leftArrow.addEventListener('click', e => {
-  e.stopPropagation();
-  currentIndex = (currentIndex - 1 + galleryImages.length) % galleryImages.length;
-  showImage();
-});
-
-rightArrow.addEventListener('click', e => {
-  e.stopPropagation();
-  currentIndex = (currentIndex + 1) % galleryImages.length;
-  showImage();
-});
-
-function showImage() {
-  lightboxImg.src = galleryImages[currentIndex].src;
-}
+})();